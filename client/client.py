@@ -8,6 +8,9 @@ import time # Time pour les timestamps
 import os # OS pour les opérations système
 
 
+BATCH_SIZE = 64 # Nombre de messages par envoi groupé quand l'intervalle est nul
+
+
 class MessageClient:
     """Client qui envoie des messages structurés au serveur"""
     def __init__(self, host, port, message_interval, payload):
@@ -45,13 +48,28 @@ class MessageClient:
         # Envoi d'un message au proxy
         message = self._create_message() # Création d'un message
         self.socket.sendall(message.encode("utf-8")) # Envoi du message
-        self.logger.info(f"Sent: {message.strip()}") # Logging du message envoyé
+        if self.logger.isEnabledFor(logging.INFO): # Formatage seulement si le niveau INFO est actif
+            self.logger.info("Sent: %s", message[:-1]) # Logging du message envoyé
         self.sequence_number += 1 # Incrémentation du numéro de séquence
 
+    def send_batch(self):
+        # Envoi groupé de BATCH_SIZE messages en un seul appel système
+        first_sequence = self.sequence_number
+        batch = bytearray()
+        for _ in range(BATCH_SIZE):
+            batch += self._create_message().encode("utf-8") # Ajout du message au lot
+            self.sequence_number += 1 # Incrémentation du numéro de séquence
+        self.socket.sendall(batch) # Envoi du lot
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Sent batch: SEQ=%d..%d", first_sequence, self.sequence_number - 1)
+
     def run(self):
         # Boucle principale du client
         try:
             self.connect() # Établissement de la connexion au proxy
+            if self.message_interval <= 0: # Sans intervalle, envoi des messages par lots
+                while True:
+                    self.send_batch()
             while True:
                 self.send_message() # Envoi d'un message au proxy
                 time.sleep(self.message_interval) # Intervalle entre les messages
@@ -3,10 +3,12 @@
 import { useState, useEffect, useRef } from "react"
 import { Terminal, Container, CheckCircle2, XCircle, AlertCircle, Maximize2, X, LayoutGrid, Trash2, Copy, Download, Check } from "lucide-react"
 import type { ContainerStatus } from "@/lib/api"
-import { getLogs } from "@/lib/api"
+import { streamLogs } from "@/lib/api"
 import { cn } from "@/lib/utils"
 import { Button } from "@/components/ui/button"
 
+const MAX_LOG_LINES = 100
+
 interface MonitoringPanelProps {
   containers: ContainerStatus[]
   isLoading: boolean
@@ -30,29 +32,25 @@ function ConsoleView({
 
   useEffect(() => {
     if (!container) return
-    let isMounted = true
-
-    const fetchLogs = async () => {
-      try {
-        const { logs: fetchedLogs } = await getLogs(container.name)
-        if (isMounted) {
-          setLogs(fetchedLogs)
-          setIsLoadingLogs(false)
-        }
-      } catch {
-        if (isMounted) {
-          setLogs(["Failed to fetch logs."])
-          setIsLoadingLogs(false)
-        }
-      }
-    }
 
-    fetchLogs()
-    const interval = setInterval(fetchLogs, 3000)
-    return () => {
-      isMounted = false
-      clearInterval(interval)
-    }
+    // The server replays the last lines on every (re)connect, so start from a clean buffer
+    const stop = streamLogs(
+      container.name,
+      (line) => {
+        setLogs((prev) => [...prev, line].slice(-MAX_LOG_LINES))
+        setIsLoadingLogs(false)
+      },
+      () => {
+        setLogs([])
+        setIsLoadingLogs(false)
+      },
+      () => {
+        setLogs(["Failed to fetch logs."])
+        setIsLoadingLogs(false)
+      },
+      MAX_LOG_LINES,
+    )
+    return stop
   }, [container?.name])
 
   useEffect(() => {
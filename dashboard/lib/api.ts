@@ -76,3 +76,23 @@ export async function getLogs(containerName: string, tail = 100): Promise<{ logs
   if (!res.ok) throw new Error("Failed to fetch logs")
   return res.json()
 }
+
+export function streamLogs(
+  containerName: string,
+  onLine: (line: string) => void,
+  onOpen?: () => void,
+  onError?: () => void,
+  tail = 100,
+): () => void {
+  const source = new EventSource(`${API_BASE}/logs/${containerName}/stream?tail=${tail}`)
+  source.onmessage = (event) => onLine(event.data)
+  if (onOpen) source.onopen = onOpen
+  // EventSource also fires onerror when the stream simply ends (e.g. a stopped container)
+  // and then reconnects on its own; only a closed source is a real failure
+  if (onError) {
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) onError()
+    }
+  }
+  return () => source.close()
+}
@@ -2,13 +2,14 @@ import asyncio
 import argparse
 import sys
 import os
-import socket
 import time
 import re
-import json
 import logging
-from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, HTTPException
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from scalar_fastapi import get_scalar_api_reference, Layout, Theme
@@ -34,89 +35,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Helper Functions ---
-
-def check_port(port: int) -> bool:
-    """Check if a port is already in use on localhost."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(0.1)
-        return s.connect_ex(('127.0.0.1', port)) == 0
-
-def load_current_env() -> Dict[str, Any]:
-    """Load current settings from .env file."""
-    settings = {
-        "use_proxy": True,
-        "proxy_mode": "random_delay",
-        "delay_min": 2.0,
-        "delay_max": 10.0,
-        "drop_rate": 0.3,
-        "reorder_window": 5,
-        "max_delay": 6.0,
-        "message_interval": 10.0,
-        "payload": "Username=ROOT=, Password=SSHTERMINAL",
-        "detection_enabled": True,
-        "simulation_timing": 0.0
-    }
-
-    if not os.path.exists('.env'):
-        return settings
-
-    try:
-        with open('.env', 'r') as f:
-            content = f.read()
-            
-            if "CLIENT_PROXY_PORT=9001" in content:
-                settings["use_proxy"] = False
-            
-            m = re.search(r"PROXY_MODE=(\w+)", content)
-            if m: settings["proxy_mode"] = m.group(1)
-            
-            m = re.search(r"PROXY_DELAY_MIN=([\d.]+)", content)
-            if m: settings["delay_min"] = float(m.group(1))
-            
-            m = re.search(r"PROXY_DELAY_MAX=([\d.]+)", content)
-            if m: settings["delay_max"] = float(m.group(1))
-            
-            m = re.search(r"PROXY_DROP_RATE=([\d.]+)", content)
-            if m: settings["drop_rate"] = float(m.group(1))
-            
-            m = re.search(r"PROXY_REORDER_WINDOW=(\d+)", content)
-            if m: settings["reorder_window"] = int(m.group(1))
-            
-            m = re.search(r"SERVER_MAX_DELAY=([\d.]+)", content)
-            if m: settings["max_delay"] = float(m.group(1))
-            
-            m = re.search(r"CLIENT_MESSAGE_INTERVAL=([\d.]+)", content)
-            if m: settings["message_interval"] = float(m.group(1))
-            
-            m = re.search(r"CLIENT_MESSAGE_PAYLOAD=(.+)", content)
-            if m: settings["payload"] = m.group(1).strip()
-
-            m = re.search(r"SERVER_DETECTION_ENABLED=(\w+)", content)
-            if m: settings["detection_enabled"] = m.group(1).lower() == "true"
-
-            m = re.search(r"SIMULATION_TIMING=([\d.]+)", content)
-            if m: settings["simulation_timing"] = float(m.group(1))
-    except Exception:
-        pass
-        
-    return settings
-
-def update_env_file(config: Dict[str, Any]) -> None:
-    """Update .env file with specified configuration."""
-    use_proxy = config["use_proxy"]
-    
-    env_content = f"""# ========================================
+# Value patterns for the .env keys we read back, compiled once at import.
+# Each entry maps a settings key to (env key, pattern, cast).
+_ENV_PATTERNS = {
+    "proxy_mode": ("PROXY_MODE", re.compile(r"\w+"), str),
+    "delay_min": ("PROXY_DELAY_MIN", re.compile(r"[\d.]+"), float),
+    "delay_max": ("PROXY_DELAY_MAX", re.compile(r"[\d.]+"), float),
+    "drop_rate": ("PROXY_DROP_RATE", re.compile(r"[\d.]+"), float),
+    "reorder_window": ("PROXY_REORDER_WINDOW", re.compile(r"\d+"), int),
+    "max_delay": ("SERVER_MAX_DELAY", re.compile(r"[\d.]+"), float),
+    "message_interval": ("CLIENT_MESSAGE_INTERVAL", re.compile(r"[\d.]+"), float),
+    "payload": ("CLIENT_MESSAGE_PAYLOAD", re.compile(r".+"), str),
+    "detection_enabled": ("SERVER_DETECTION_ENABLED", re.compile(r"\w+"), lambda v: v.lower() == "true"),
+    "simulation_timing": ("SIMULATION_TIMING", re.compile(r"[\d.]+"), float),
+}
+
+# Leading token of CLIENT_PROXY_PORT, used to detect direct (no proxy) mode
+_PORT_PATTERN = re.compile(r"\d+")
+
+# Template written by update_env_file; placeholders are ConfigModel fields
+# plus the values derived from use_proxy.
+_ENV_TEMPLATE = """# ========================================
 # MITM Detection System - Configuration
 # ========================================
 
 # ----------------
 # Client Settings
 # ----------------
-CLIENT_PROXY_HOST={'proxy' if use_proxy else 'server'}
-CLIENT_PROXY_PORT={'9000' if use_proxy else '9001'}
-CLIENT_MESSAGE_INTERVAL={config['message_interval']}
-CLIENT_MESSAGE_PAYLOAD={config['payload']}
+CLIENT_PROXY_HOST={client_proxy_host}
+CLIENT_PROXY_PORT={client_proxy_port}
+CLIENT_MESSAGE_INTERVAL={message_interval}
+CLIENT_MESSAGE_PAYLOAD={payload}
 
 # ----------------
 # Proxy Settings
@@ -127,37 +76,148 @@ PROXY_SERVER_HOST=server
 PROXY_SERVER_PORT=9001
 
 # Valid modes: transparent, random_delay, drop, reorder
-PROXY_MODE={config['proxy_mode']}
+PROXY_MODE={proxy_mode}
 
 # Random Delay Mode Settings (seconds)
-PROXY_DELAY_MIN={config['delay_min']}
-PROXY_DELAY_MAX={config['delay_max']}
+PROXY_DELAY_MIN={delay_min}
+PROXY_DELAY_MAX={delay_max}
 
 # Drop Mode Settings (0.0 to 1.0, e.g., 0.3 = 30% drop rate)
-PROXY_DROP_RATE={config['drop_rate']}
+PROXY_DROP_RATE={drop_rate}
 
 # Reorder Mode Settings (buffer size for reordering)
-PROXY_REORDER_WINDOW={config['reorder_window']}
+PROXY_REORDER_WINDOW={reorder_window}
 
-PROXY_BUFFER_SIZE=4096
+PROXY_BUFFER_SIZE=65536
 
 # ----------------
 # Server Settings
 # ----------------
 SERVER_LISTEN_HOST=0.0.0.0
 SERVER_LISTEN_PORT=9001
-SERVER_MAX_DELAY={config['max_delay']}
+SERVER_MAX_DELAY={max_delay}
 SERVER_BUFFER_SIZE=4096
-SERVER_DETECTION_ENABLED={'true' if config.get('detection_enabled', True) else 'false'}
+SERVER_DETECTION_ENABLED={detection_enabled}
 
 # ----------------
 # Simulation Settings
 # ----------------
-SIMULATION_TIMING={config.get('simulation_timing', 0.0)}
+SIMULATION_TIMING={simulation_timing}
 """
-    
-    with open('.env', 'w') as f:
-        f.write(env_content)
+
+# Parsed .env settings, keyed by the file's mtime so edits invalidate it
+_env_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+
+# Successful Docker probes are trusted for this long (seconds)
+DOCKER_CHECK_TTL = 30.0
+_docker_ok_until = 0.0
+
+# Bytes read per chunk from `docker logs` output (lines may be longer than this)
+LOG_READ_CHUNK = 65536
+
+# --- Helper Functions ---
+
+async def check_port(port: int) -> bool:
+    """Check if a port is already in use on localhost."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 0.1)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+async def find_busy_ports(ports: List[int]) -> List[int]:
+    """Probe all ports concurrently and return the ones already in use."""
+    results = await asyncio.gather(*(check_port(p) for p in ports))
+    return [p for p, busy in zip(ports, results) if busy]
+
+def load_current_env() -> Dict[str, Any]:
+    """Load current settings from .env file."""
+    global _env_cache
+
+    settings = {
+        "use_proxy": True,
+        "proxy_mode": "random_delay",
+        "delay_min": 2.0,
+        "delay_max": 10.0,
+        "drop_rate": 0.3,
+        "reorder_window": 5,
+        "max_delay": 6.0,
+        "message_interval": 10.0,
+        "payload": "Username=ROOT=, Password=SSHTERMINAL",
+        "detection_enabled": True,
+        "simulation_timing": 0.0
+    }
+
+    try:
+        mtime = os.stat('.env').st_mtime_ns
+    except OSError:
+        return settings
+
+    if _env_cache and _env_cache[0] == mtime:
+        return dict(_env_cache[1])
+
+    try:
+        env = {}
+        with open('.env', 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                key, sep, value = line.partition('=')
+                if not sep:
+                    continue
+                env[key.strip()] = value.strip()
+
+        # Direct mode points the client at the server port (same leading-token match as below)
+        port = _PORT_PATTERN.match(env.get("CLIENT_PROXY_PORT", ""))
+        if port and port.group(0) == "9001":
+            settings["use_proxy"] = False
+
+        # Keep only the leading valid token of each value (drops trailing "# ..." comments)
+        for name, (key, pattern, cast) in _ENV_PATTERNS.items():
+            m = pattern.match(env.get(key, ""))
+            if m:
+                try:
+                    settings[name] = cast(m.group(0))
+                except ValueError:
+                    pass
+    except Exception:
+        pass
+
+    _env_cache = (mtime, dict(settings))
+    return settings
+
+def update_env_file(config: "ConfigModel") -> None:
+    """Update .env file with specified configuration."""
+    global _env_cache
+
+    use_proxy = config.use_proxy
+    env_vars = {
+        **config.model_dump(),
+        "client_proxy_host": "proxy" if use_proxy else "server",
+        "client_proxy_port": "9000" if use_proxy else "9001",
+        "detection_enabled": "true" if config.detection_enabled else "false"
+    }
+    env_content = _ENV_TEMPLATE.format_map(env_vars)
+
+    new_content = env_content.encode()
+    try:
+        with open('.env', 'rb') as f:
+            if f.read() == new_content:
+                return
+    except OSError:
+        pass
+
+    # Write to a temporary file and swap it in atomically so readers never see a partial .env
+    _env_cache = None
+    with open('.env.tmp', 'wb') as f:
+        f.write(new_content)
+    os.replace('.env.tmp', '.env')
 
 async def run_command(cmd: List[str]) -> str:
     """Run a shell command asynchronously and return stdout."""
@@ -173,14 +233,45 @@ async def run_command(cmd: List[str]) -> str:
     
     return stdout.decode().strip()
 
+async def iter_lines(stream: asyncio.StreamReader) -> AsyncIterator[str]:
+    """Yield non-empty decoded lines from a subprocess stream.
+
+    Reads fixed-size chunks instead of using StreamReader line iteration, whose
+    64 KiB line limit aborts on a single long log line.
+    """
+    pending = b""
+    while True:
+        chunk = await stream.read(LOG_READ_CHUNK)
+        if not chunk:
+            break
+        *complete, pending = (pending + chunk).split(b"\n")
+        for raw in complete:
+            line = raw.decode('utf-8', 'replace').rstrip()
+            if line:
+                yield line
+    line = pending.decode('utf-8', 'replace').rstrip()
+    if line:
+        yield line
+
+async def read_lines(stream: asyncio.StreamReader, limit: int) -> List[str]:
+    """Read non-empty lines from a subprocess stream, keeping at most the last `limit`."""
+    lines = deque(maxlen=limit if limit > 0 else None)
+    async for line in iter_lines(stream):
+        lines.append(line)
+    return list(lines)
+
 async def check_docker() -> bool:
-    """Check if Docker and docker-compose are available."""
-    try:
-        await run_command(["docker-compose", "--version"])
-        await run_command(["docker", "info"])
+    """Check if the Docker CLI works and the daemon is reachable (cached for DOCKER_CHECK_TTL seconds)."""
+    global _docker_ok_until
+
+    if time.monotonic() < _docker_ok_until:
         return True
+    try:
+        await run_command(["docker", "version", "--format", "{{.Server.Version}}"])
     except:
         return False
+    _docker_ok_until = time.monotonic() + DOCKER_CHECK_TTL
+    return True
 
 # --- API Models ---
 
@@ -218,15 +309,22 @@ async def scalar_html():
     )
 
 @app.get("/config")
-async def get_config():
-    """Get current configuration."""
-    return load_current_env()
+async def get_config(request: Request):
+    """Get current configuration (supports If-None-Match revalidation)."""
+    try:
+        etag = f'W/"{os.stat(".env").st_mtime_ns}"'
+    except OSError:
+        return load_current_env()
+
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=load_current_env(), headers={"ETag": etag})
 
 @app.post("/config")
 async def post_config(config: ConfigModel):
     """Update configuration."""
     try:
-        update_env_file(config.dict())
+        update_env_file(config)
         return {"status": "success", "message": "Configuration updated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -257,7 +355,7 @@ async def start_simulation(build: bool = False):
     
     # Check for port conflicts
     ports_to_check = [9000, 9001]
-    conflicts = [p for p in ports_to_check if check_port(p)]
+    conflicts = await find_busy_ports(ports_to_check)
     
     if conflicts:
         try:
@@ -266,7 +364,7 @@ async def start_simulation(build: bool = False):
         except:
             pass
             
-        if any(check_port(p) for p in ports_to_check):
+        if await find_busy_ports(ports_to_check):
             raise HTTPException(status_code=409, detail=f"Ports {conflicts} are busy")
 
     cmd = ["docker-compose", "up", "-d"]
@@ -309,18 +407,19 @@ async def get_status():
         containers = []
         if stdout:
             try:
-                raw_data = json.loads(stdout)
+                raw_data = orjson.loads(stdout)
                 if isinstance(raw_data, list):
                     containers_data = raw_data
                 else:
                     containers_data = [raw_data]
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
+                # Newer docker-compose prints one JSON object per line
                 containers_data = []
-                for line in stdout.split('\n'):
+                for line in stdout.splitlines():
                     if line.strip():
                         try:
-                            containers_data.append(json.loads(line))
-                        except:
+                            containers_data.append(orjson.loads(line))
+                        except orjson.JSONDecodeError:
                             continue
             
             for item in containers_data:
@@ -359,19 +458,53 @@ async def get_logs(container_name: str, tail: int = 100):
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
-        stdout, stderr = await process.communicate()
-        
+        try:
+            # Read both pipes concurrently so a full stderr pipe cannot stall docker
+            lines, err_lines = await asyncio.gather(
+                read_lines(process.stdout, tail),
+                read_lines(process.stderr, tail)
+            )
+        except BaseException:
+            # Never leave docker running (or unreaped) if reading failed
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+            raise
+        await process.wait()
+
         if process.returncode != 0:
-             return {"logs": [f"Error fetching logs: {stderr.decode().strip()}"]}
+             return {"logs": [f"Error fetching logs: {'; '.join(err_lines)}"]}
 
-        lines = [line for line in stdout.decode().split('\n') if line.strip()]
-        err_lines = [line for line in stderr.decode().split('\n') if line.strip()]
         all_logs = lines + err_lines
         
         return {"logs": all_logs}
     except Exception as e:
         return {"logs": [f"System error: {str(e)}"]}
 
+@app.get("/logs/{container_name}/stream")
+async def stream_logs(container_name: str, tail: int = 100):
+    """Stream logs for a specific container as Server-Sent Events."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "docker", "logs", "--follow", "--tail", str(tail), container_name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"System error: {str(e)}")
+
+    async def events():
+        try:
+            async for line in iter_lines(process.stdout):
+                yield f"data: {line}\n\n"
+        finally:
+            # Client disconnected or container gone: stop following
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.post("/simulation/reset")
 async def reset_config():
     """Reset configuration to factory defaults."""
@@ -388,7 +521,7 @@ async def reset_config():
         "detection_enabled": True,
         "simulation_timing": 0.0
     }
-    update_env_file(factory_defaults)
+    update_env_file(ConfigModel(**factory_defaults))
     return {"status": "success", "message": "Reset to factory defaults"}
 
 if __name__ == "__main__":
@@ -4,13 +4,54 @@ Intercepte et manipule le trafic entre le client et le serveur pour simuler des
 """
 
 import socket
-import threading
+import select
+import selectors
 import logging
 import os
 import time
+import threading
 import random
-from enum import Enum
 from collections import deque
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import liburing  # Optionnel : réacteur io_uring sous Linux (pip install liburing)
+except ImportError:
+    liburing = None
+
+
+# Taille des tampons noyau (SO_SNDBUF / SO_RCVBUF) des sockets du proxy
+SOCKET_BUFFER_SIZE = 1 << 20
+
+# Nombre maximal de connexions clientes traitées en parallèle
+MAX_CONNECTIONS = 64
+
+# Nombre de tirages aléatoires 16 bits de la réserve du mode drop
+RAND_POOL_SIZE = 4096
+
+# Octets transférés par appel splice() en mode transparent (capacité par défaut d'un pipe Linux)
+SPLICE_CHUNK = 65536
+
+# Profondeur de l'anneau io_uring et types d'opération encodés dans user_data
+URING_DEPTH = 256
+URING_RECV = 0
+URING_SEND = 1
+# user_data de la requête d'annulation soumise à la fermeture (hors des valeurs index << 1 | op)
+URING_CANCEL = 1 << 2
+# Attente maximale (ms) des complétions annulées avant de couper les sockets pour les forcer
+URING_DRAIN_TIMEOUT_MS = 1000
+
+# Nombre maximal de tampons par sendmsg() (au-delà, le noyau refuse avec EMSGSIZE)
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = -1
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+# Intervalle (secondes) entre deux journalisations du trafic transféré par direction
+STATS_INTERVAL = 1.0
 
 
 class AttackMode(Enum):
@@ -21,11 +62,28 @@ class AttackMode(Enum):
     REORDER = "reorder"  # Réorganise les paquets dans une fenêtre de tampon
 
 
+class TrafficCounter:
+    """Octets et paquets transférés dans une direction, journalisés par lots plutôt qu'à chaque paquet."""
+    __slots__ = ("direction", "bytes", "chunks")
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.bytes = 0
+        self.chunks = 0
+
+    def report(self, logger):
+        """Journalise puis remet à zéro les compteurs (rien si aucun paquet depuis le dernier rapport)."""
+        if self.chunks:
+            logger.info("%s: forwarded %d bytes in %d chunks", self.direction, self.bytes, self.chunks)
+            self.bytes = 0
+            self.chunks = 0
+
+
 class MITMProxy:
     """MITM Proxy Server"""
 
     def __init__(self, proxy_host, proxy_port, server_host, server_port, mode, 
-                 delay_min=2.0, delay_max=10.0, drop_rate=0.3, reorder_window=5, buffer_size=4096):
+                 delay_min=2.0, delay_max=10.0, drop_rate=0.3, reorder_window=5, buffer_size=65536):
         """Initialize proxy attributes"""
         self.proxy_host = proxy_host
         self.proxy_port = proxy_port
@@ -38,6 +96,12 @@ class MITMProxy:
         self.delay_max = delay_max
         self.drop_rate = drop_rate
         self.reorder_window = reorder_window
+
+        # Réserve de tirages 16 bits pour le mode drop, rechargée tous les RAND_POOL_SIZE paquets
+        # (seuil arrondi au 1/65536 : 5 % reste 5 %, et les taux < 1/256 ne sont plus ramenés à 0)
+        self._drop_threshold = round(drop_rate * 65536)
+        self._rand_pool = None
+        self._rand_index = RAND_POOL_SIZE
         
         try:
             self.mode = AttackMode(mode.lower())
@@ -45,7 +109,29 @@ class MITMProxy:
             self.mode = AttackMode.TRANSPARENT
             logging.warning(f"Invalid mode '{mode}', defaulting to transparent")
         
+        # Traitement des données selon le mode d'attaque, choisi une seule fois :
+        # _process_data(data, buffer) reçoit le tampon propre à la connexion et à la direction
+        self._process_data = {
+            AttackMode.TRANSPARENT: self._process_transparent,
+            AttackMode.RANDOM_DELAY: self._process_random_delay,
+            AttackMode.DROP: self._process_drop,
+            AttackMode.REORDER: self._process_reorder,
+        }[self.mode]
+
+        # io_uring quand liburing est disponible ; le mode random_delay garde le sélecteur pour ses échéances,
+        # et le mode transparent garde splice() (zéro copie) là où il existe, io_uring copiant chaque paquet
+        splice_available = self.mode == AttackMode.TRANSPARENT and hasattr(os, "splice")
+        self.use_uring = liburing is not None and self.mode != AttackMode.RANDOM_DELAY and not splice_available
+
         self.proxy_socket = None
+        self.pool = None
+        # Sockets des connexions en cours, coupés par close() pour que les relais se terminent
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        # Connexions confiées au pool et pas encore terminées (au plus MAX_CONNECTIONS)
+        self.active_connections = 0
+        # Positionné par close() : interrompt l'attente des échéances restantes au vidage des tampons
+        self._closing = threading.Event()
         self._setup_logging()
 
     def _setup_logging(self):
@@ -56,141 +142,436 @@ class MITMProxy:
         )
         self.logger = logging.getLogger(__name__)
 
-    def _process_data(self, data, buffer):
-        """Traitement des données selon le mode d'attaque"""
-        if self.mode == AttackMode.TRANSPARENT:
-            return data
-
-        elif self.mode == AttackMode.RANDOM_DELAY:
-            delay = random.uniform(self.delay_min, self.delay_max)
-            self.logger.warning(f"MODE = Random Delay → delaying {delay:.2f}s")
-            time.sleep(delay)
-            return data
-
-        elif self.mode == AttackMode.DROP:
-            # Retire aléatoirement des paquets selon drop_rate
-            if random.random() < self.drop_rate:
-                self.logger.warning(f"MODE = Drop → packet DROPPED (drop_rate={self.drop_rate})")
-                return None  # Signal to drop this packet
-            return data
-
-        elif self.mode == AttackMode.REORDER:
-            # Ajoute le paquet au tampon de reorganisation
-            buffer.append(data)
-            
-            # Si le tampon est plein, sélectionne aléatoirement un paquet à envoyer
-            if len(buffer) >= self.reorder_window:
-                # Sélectionne aléatoirement un index à envoyer
-                index = random.randint(0, len(buffer) - 1)
-                packet = buffer[index]
-                # Supprime par index (O(N) pour deque mais bon pour des fenêtres petites)
-                del buffer[index]
-                self.logger.warning(f"MODE = Reorder → sending packet from position {index} (buffer size: {len(buffer)})")
-                return packet
-            else:
-                # Tampon non plein encore, garde le paquet
-                self.logger.info(f"MODE = Reorder → buffering packet (buffer: {len(buffer)}/{self.reorder_window})")
-                return None  # Signal to not send yet
+    def _tune_socket(self, sock):
+        """Désactive Nagle et agrandit les tampons noyau du socket."""
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+
+    def _process_transparent(self, data, buffer):
+        """Mode transparent : les données passent sans altération"""
+        return data
 
+    def _process_random_delay(self, data, buffer):
+        """Mode random_delay : planifie l'envoi à l'heure prévue au lieu de bloquer la lecture.
+        Les échéances ne reculent jamais : un paquet ne double pas le précédent (ordre FIFO du flux)"""
+        delay = random.uniform(self.delay_min, self.delay_max)
+        self.logger.warning(f"MODE = Random Delay → delaying {delay:.2f}s")
+        deadline = time.monotonic() + delay
+        if buffer and buffer[-1][0] > deadline:
+            deadline = buffer[-1][0]
+        buffer.append((deadline, data))
+        return None  # Signal to send later
+
+    def _process_drop(self, data, buffer):
+        """Mode drop : retire aléatoirement des paquets selon drop_rate (un tirage 16 bits par décision)"""
+        index = self._rand_index
+        if index >= RAND_POOL_SIZE:
+            self._rand_pool = memoryview(os.urandom(RAND_POOL_SIZE * 2)).cast("H")
+            index = 0
+        self._rand_index = index + 1
+        if self._rand_pool[index] < self._drop_threshold:
+            self.logger.warning(f"MODE = Drop → packet DROPPED (drop_rate={self.drop_rate})")
+            return None  # Signal to drop this packet
         return data
 
-    def _forward(self, source, destination, direction):
-        """Forward data from source to destination with optional manipulation."""
-        # Créer un tampon local pour cette direction si en mode de reorganisation
-        buffer = deque(maxlen=self.reorder_window) if self.mode == AttackMode.REORDER else None
+    def _process_reorder(self, data, buffer):
+        """Mode reorder : réorganise les paquets dans une fenêtre de tampon"""
+        # Ajoute le paquet au tampon de reorganisation
+        buffer.append(data)
         
+        # Si le tampon est plein, sélectionne aléatoirement un paquet à envoyer
+        if len(buffer) >= self.reorder_window:
+            # Sélectionne aléatoirement un index à envoyer
+            index = random.randint(0, len(buffer) - 1)
+            packet = buffer[index]
+            # Retrait en O(1) : le dernier paquet prend la place de celui envoyé
+            buffer[index] = buffer[-1]
+            buffer.pop()
+            self.logger.warning(f"MODE = Reorder → sending packet from position {index} (buffer size: {len(buffer)})")
+            return packet
+        else:
+            # Tampon non plein encore, garde le paquet
+            self.logger.info(f"MODE = Reorder → buffering packet (buffer: {len(buffer)}/{self.reorder_window})")
+            return None  # Signal to not send yet
+
+    def _passthrough(self, source, destination, traffic, view, buffer):
+        """Mode transparent : renvoi direct du tampon de réception, sans copie ni traitement.
+        Retourne False quand la source a fermé la connexion."""
+        n = source.recv_into(view)
+        if not n:
+            return False
+        destination.sendall(view[:n])
+        traffic.bytes += n
+        traffic.chunks += 1
+        return True
+
+    def _forward(self, source, destination, traffic, view, buffer):
+        """Forward one chunk from source to destination with optional manipulation.
+        Retourne False quand la source a fermé la connexion."""
+        n = source.recv_into(view)
+        if not n:
+            return False
+
+        # Traitement des données selon le mode d'attaque
+        processed = self._process_data(bytes(view[:n]), buffer)
+
+        # Si processed est None, le paquet est retiré ou tamponné
+        if processed is not None:
+            destination.sendall(processed)
+            traffic.bytes += len(processed)
+            traffic.chunks += 1
+        return True
+
+    def _splice(self, source, destination, traffic, pipe):
+        """Transfert zéro-copie de source vers destination, entièrement dans le noyau, via un pipe.
+        Retourne False quand la source a fermé la connexion."""
+        read_end, write_end = pipe
+        n = os.splice(source.fileno(), write_end, SPLICE_CHUNK, flags=os.SPLICE_F_MOVE)
+        if not n:
+            return False
+
+        remaining = n
+        while remaining:
+            remaining -= os.splice(read_end, destination.fileno(), remaining, flags=os.SPLICE_F_MOVE)
+        traffic.bytes += n
+        traffic.chunks += 1
+        return True
+
+    def _new_buffer(self):
+        """Tampon d'une direction : file FIFO (échéance, paquet) en random_delay, liste en reorder."""
+        if self.mode == AttackMode.RANDOM_DELAY:
+            return deque()
+        if self.mode == AttackMode.REORDER:
+            return []
+        return None
+
+    def _send_due_packets(self, destination, traffic, buffer, now):
+        """Envoi des paquets retardés dont l'échéance est atteinte."""
+        while buffer and buffer[0][0] <= now:
+            _, packet = buffer.popleft()
+            destination.sendall(packet)
+            traffic.bytes += len(packet)
+            traffic.chunks += 1
+
+    def _next_timeout(self, routes, report_at):
+        """Délai avant la prochaine échéance : paquet retardé ou journalisation du trafic."""
+        deadlines = [report_at]
+        if self.mode == AttackMode.RANDOM_DELAY:
+            deadlines.extend(buffer[0][0] for _, _, buffer in routes.values() if buffer)
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _send_batch(self, destination, traffic, packets):
+        """Envoi de plusieurs paquets en un minimum d'appels système (scatter-gather, IOV_MAX tampons par appel)."""
+        for start in range(0, len(packets), IOV_MAX):
+            batch = packets[start:start + IOV_MAX]
+            size = sum(len(packet) for packet in batch)
+            sent = destination.sendmsg(batch)
+            if sent < size:
+                # Envoi partiel : on complète avec le reste des données
+                destination.sendall(b"".join(batch)[sent:])
+            traffic.bytes += size
+            traffic.chunks += len(batch)
+
+    def _flush_buffer(self, destination, traffic, buffer):
+        """Vider le tampon (reorganisation ou paquets retardés) vers la destination."""
+        if not buffer:
+            return
+        self.logger.info(f"[{traffic.direction}] Flushing buffer ({len(buffer)} packets)")
+        try:
+            if self.mode == AttackMode.RANDOM_DELAY:
+                # Respecte les échéances restantes avant de fermer, sauf si le proxy s'arrête
+                while buffer:
+                    if self._closing.wait(max(0.0, buffer[0][0] - time.monotonic())):
+                        break
+                    self._send_due_packets(destination, traffic, buffer, time.monotonic())
+            else:
+                self._send_batch(destination, traffic, buffer)
+        except:
+            pass
+        buffer.clear()
+
+    def _relay(self, client_socket, server_socket):
+        """Multiplexe les deux directions dans un seul thread avec un sélecteur (epoll sous Linux)."""
+        # Tampon de réception réutilisé pour éviter une allocation par paquet
+        view = memoryview(bytearray(self.buffer_size))
+
+        # Pour chaque socket source : (destination, compteur de la direction, tampon de reorganisation ou de retard)
+        routes = {
+            client_socket: (server_socket, TrafficCounter("CLIENT → SERVER"), self._new_buffer()),
+            server_socket: (client_socket, TrafficCounter("SERVER → CLIENT"), self._new_buffer()),
+        }
+
+        # Mode transparent sous Linux : splice() évite toute copie en espace utilisateur
+        pipe = os.pipe() if self.mode == AttackMode.TRANSPARENT and hasattr(os, "splice") else None
+        # Sinon, fonction de transfert choisie une fois pour toute la connexion
+        forward = self._passthrough if self.mode == AttackMode.TRANSPARENT else self._forward
+
+        with selectors.DefaultSelector() as selector:
+            for sock, route in routes.items():
+                selector.register(sock, selectors.EVENT_READ, data=route)
+
+            report_at = time.monotonic() + STATS_INTERVAL
+            try:
+                while True:
+                    for key, _ in selector.select(self._next_timeout(routes, report_at)):
+                        destination, traffic, buffer = key.data
+                        if pipe:
+                            alive = self._splice(key.fileobj, destination, traffic, pipe)
+                        else:
+                            alive = forward(key.fileobj, destination, traffic, view, buffer)
+                        if not alive:
+                            self.logger.info(f"{traffic.direction}: connection closed")
+                            return
+
+                    now = time.monotonic()
+                    if self.mode == AttackMode.RANDOM_DELAY:
+                        for destination, traffic, buffer in routes.values():
+                            self._send_due_packets(destination, traffic, buffer, now)
+
+                    # Journalisation groupée du trafic, au plus une fois par intervalle
+                    if now >= report_at:
+                        for _, traffic, _ in routes.values():
+                            traffic.report(self.logger)
+                        report_at = now + STATS_INTERVAL
+
+            except Exception as e:
+                self.logger.info(f"Relay stopped ({e})")
+
+            finally:
+                # Vider les tampons avant de fermer
+                for destination, traffic, buffer in routes.values():
+                    self._flush_buffer(destination, traffic, buffer)
+                    traffic.report(self.logger)
+                if pipe:
+                    for fd in pipe:
+                        os.close(fd)
+
+    def _relay_uring(self, client_socket, server_socket):
+        """Relaye les deux directions avec un anneau io_uring : les réceptions et envois
+        des deux sockets sont soumis ensemble et attendus par un seul appel système."""
+        ring = liburing.Ring()
+        cqe = liburing.Cqe()
         try:
+            liburing.io_uring_queue_init(URING_DEPTH, ring)
+        except Exception as e:
+            self.logger.warning(f"io_uring unavailable ({e}), falling back to selectors")
+            self.use_uring = False
+            return self._relay(client_socket, server_socket)
+
+        # Par direction : (source, destination, compteur, tampon de réception, tampon de reorganisation)
+        routes = [
+            (client_socket, server_socket, TrafficCounter("CLIENT → SERVER"), bytearray(self.buffer_size),
+             [] if self.mode == AttackMode.REORDER else None),
+            (server_socket, client_socket, TrafficCounter("SERVER → CLIENT"), bytearray(self.buffer_size),
+             [] if self.mode == AttackMode.REORDER else None),
+        ]
+        # Envoi en cours par direction : (données, octets déjà envoyés, objet soumis au noyau).
+        # liburing ne garde que le pointeur du tampon : l'objet soumis doit rester référencé
+        # ici jusqu'à sa complétion (la tranche d'un envoi partiel serait sinon libérée avant submit)
+        sending = [None, None]
+        # user_data des opérations préparées dont la complétion n'a pas encore été traitée
+        inflight = set()
+
+        def prep_recv(index):
+            source, _, _, recv_buffer, _ = routes[index]
+            inflight.add(index << 1 | URING_RECV)
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_recv(sqe, source.fileno(), recv_buffer)
+            liburing.io_uring_sqe_set_data64(sqe, index << 1 | URING_RECV)
+
+        def prep_send(index, data, offset):
+            _, destination, _, _, _ = routes[index]
+            # prep_send refuse les memoryview : le reste d'un envoi partiel est copié dans un bytes
+            chunk = data[offset:] if offset else data
+            sending[index] = (data, offset, chunk)
+            inflight.add(index << 1 | URING_SEND)
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_send(sqe, destination.fileno(), chunk)
+            liburing.io_uring_sqe_set_data64(sqe, index << 1 | URING_SEND)
+
+        def complete(entry):
+            """Traite une complétion ; retourne False quand une source a fermé la connexion."""
+            res = entry.res
+            user_data = liburing.io_uring_cqe_get_data64(entry)
+            liburing.io_uring_cqe_seen(ring, entry)
+            inflight.discard(user_data)
+
+            index, op = user_data >> 1, user_data & 1
+            _, _, traffic, recv_buffer, buffer = routes[index]
+            if res < 0:
+                raise OSError(-res, os.strerror(-res))
+
+            if op == URING_RECV:
+                if res == 0:
+                    self.logger.info(f"{traffic.direction}: connection closed")
+                    return False
+
+                # Une seule opération en vol par direction : la réception suivante attend la fin de l'envoi
+                if self.mode == AttackMode.TRANSPARENT:
+                    processed = bytes(recv_buffer[:res])
+                else:
+                    processed = self._process_data(bytes(recv_buffer[:res]), buffer)
+
+                if processed is None:
+                    prep_recv(index)
+                else:
+                    prep_send(index, processed, 0)
+            else:
+                data, offset, _ = sending[index]
+                offset += res
+                if offset < len(data):
+                    # Envoi partiel : on soumet le reste
+                    prep_send(index, data, offset)
+                else:
+                    sending[index] = None
+                    traffic.bytes += len(data)
+                    traffic.chunks += 1
+                    prep_recv(index)
+            return True
+
+        def drain():
+            """Annule les opérations encore en vol et attend leurs complétions : le noyau ne doit plus
+            écrire dans recv_buffer ni lire les données de sending une fois l'anneau fermé."""
+            if not inflight:
+                return
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_cancel64(sqe, 0, liburing.IORING_ASYNC_CANCEL_ANY)
+            liburing.io_uring_sqe_set_data64(sqe, URING_CANCEL)
+            liburing.io_uring_submit(ring)
+
+            cancel_pending = True
+            forced = False
+            while inflight or cancel_pending:
+                if not poller.poll(None if forced else URING_DRAIN_TIMEOUT_MS):
+                    # Annulation refusée (noyau ancien) ou trop lente : couper les sockets termine les opérations
+                    for sock in (client_socket, server_socket):
+                        try:
+                            sock.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+                    forced = True
+                    continue
+                for _ in range(liburing.io_uring_cq_ready(ring)):
+                    liburing.io_uring_peek_cqe(ring, cqe)
+                    user_data = liburing.io_uring_cqe_get_data64(cqe[0])
+                    liburing.io_uring_cqe_seen(ring, cqe[0])
+                    if user_data == URING_CANCEL:
+                        cancel_pending = False
+                    else:
+                        inflight.discard(user_data)
+
+        # L'attente se fait sur le descripteur de l'anneau avec poll(), qui libère le GIL
+        # (io_uring_wait_cqe le garde et bloquerait les autres connexions)
+        poller = select.poll()
+        poller.register(ring.ring_fd, select.POLLIN)
+
+        try:
+            prep_recv(0)
+            prep_recv(1)
+            liburing.io_uring_submit(ring)
+
+            report_at = time.monotonic() + STATS_INTERVAL
             while True:
-                data = source.recv(self.buffer_size)
-                if not data:
-                    break
-                
-                # Traitement des données selon le mode d'attaque
-                processed = self._process_data(data, buffer)
-                
-                # Si processed est None, le paquet est retiré ou tamponné
-                if processed is not None:
-                    destination.sendall(processed)
-                    self.logger.info(f"{direction}: forwarded {len(processed)} bytes")
+                # Réveil au plus tard à la prochaine journalisation du trafic (poll attend des millisecondes)
+                poller.poll(max(0.0, report_at - time.monotonic()) * 1000)
+                # Traite toutes les complétions prêtes, puis soumet les nouvelles opérations en un appel
+                for _ in range(liburing.io_uring_cq_ready(ring)):
+                    liburing.io_uring_peek_cqe(ring, cqe)
+                    if not complete(cqe[0]):
+                        return
+                liburing.io_uring_submit(ring)
+
+                # Journalisation groupée du trafic, au plus une fois par intervalle
+                now = time.monotonic()
+                if now >= report_at:
+                    for _, _, traffic, _, _ in routes:
+                        traffic.report(self.logger)
+                    report_at = now + STATS_INTERVAL
 
         except Exception as e:
-            self.logger.info(f"{direction}: stopped ({e})")
+            self.logger.info(f"Relay stopped ({e})")
 
         finally:
-            # Vider le tampon de reorganisation si en mode de reorganisation
-            if self.mode == AttackMode.REORDER and buffer and len(buffer) > 0:
-                self.logger.info(f"[{direction}] Flushing reorder buffer ({len(buffer)} packets)")
-                while buffer:
-                    packet = buffer.popleft()
-                    try:
-                        destination.sendall(packet)
-                    except:
-                        pass
-            
             try:
-                source.close()
-            except:
-                pass
-            try:
-                destination.close()
-            except:
-                pass
+                drain()
+            except Exception as e:
+                self.logger.warning(f"io_uring drain failed ({e})")
+            liburing.io_uring_queue_exit(ring)
+            # Vider les tampons avant de fermer
+            for _, destination, traffic, _, buffer in routes:
+                self._flush_buffer(destination, traffic, buffer)
+                traffic.report(self.logger)
 
     def _handle_connection(self, client_socket, client_addr):
         """Gestion de la connexion client en établissant une connexion serveur et en transférant les données."""
         self.logger.info(f"Client connected from {client_addr}")
+        server_socket = None
+        self._track(client_socket)
         try:
+            self._tune_socket(client_socket)
+
             # Connexion au serveur réel
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._track(server_socket)
+            self._tune_socket(server_socket)
             server_socket.connect((self.server_host, self.server_port))
             self.logger.info(f"Connected to server at {self.server_host}:{self.server_port}")
 
-            # Créer des threads bidirectionnels
-            client_to_server = threading.Thread(
-                target=self._forward,
-                args=(client_socket, server_socket, "CLIENT → SERVER"),
-                daemon=True
-            )
-            server_to_client = threading.Thread(
-                target=self._forward,
-                args=(server_socket, client_socket, "SERVER → CLIENT"),
-                daemon=True
-            )
-
-            # Démarre le transfert
-            client_to_server.start()
-            server_to_client.start()
-
-            # Attend que les deux threads soient terminés
-            client_to_server.join()
-            server_to_client.join()
+            # Transfert bidirectionnel dans le thread courant
+            if self.use_uring:
+                self._relay_uring(client_socket, server_socket)
+            else:
+                self._relay(client_socket, server_socket)
 
         except Exception as e:
             self.logger.error(f"Error handling connection from {client_addr}: {e}")
         finally:
+            with self.connections_lock:
+                self.connections.discard(client_socket)
+                self.connections.discard(server_socket)
+                self.active_connections -= 1
+            if server_socket:
+                server_socket.close()
             client_socket.close()
 
+    def _track(self, sock):
+        """Enregistre un socket de connexion en cours."""
+        with self.connections_lock:
+            self.connections.add(sock)
+
     def run(self):
         """Démarrer le serveur proxy et écouter les connexions."""
         try:
             # Créer et configurer le socket proxy
             self.proxy_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.proxy_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._tune_socket(self.proxy_socket)
             self.proxy_socket.bind((self.proxy_host, self.proxy_port))
-            self.proxy_socket.listen(5)
+            self.proxy_socket.listen(MAX_CONNECTIONS)
             self.logger.info(f"Proxy listening on {self.proxy_host}:{self.proxy_port}")
             self.logger.info(f"Running in MODE={self.mode.value}")
+            self.logger.info(f"I/O backend: {'io_uring' if self.use_uring else 'selectors'}")
 
+            # Pool de threads réutilisés : pas de création de thread par connexion
+            self.pool = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS, thread_name_prefix="proxy-conn")
             while True:
                 # Gestion de la connexion client
                 client_socket, client_addr = self.proxy_socket.accept()
-                # Gestion de chaque connexion dans un nouveau thread pour supporter plusieurs clients
-                client_thread = threading.Thread(
-                    target=self._handle_connection,
-                    args=(client_socket, client_addr),
-                    daemon=True
-                )
-                client_thread.start()
+
+                # Tous les threads sont occupés : refuser plutôt que laisser le client attendre en file
+                with self.connections_lock:
+                    accepted = self.active_connections < MAX_CONNECTIONS
+                    if accepted:
+                        self.active_connections += 1
+                if not accepted:
+                    self.logger.warning(
+                        f"Refusing connection from {client_addr}: all {MAX_CONNECTIONS} connection slots are busy"
+                    )
+                    client_socket.close()
+                    continue
+
+                self.pool.submit(self._handle_connection, client_socket, client_addr)
 
         except KeyboardInterrupt:
             self.logger.info("Proxy interrupted (Ctrl+C)")
@@ -204,6 +585,17 @@ class MITMProxy:
 
     def close(self):
         """Fermeture du socket proxy."""
+        self._closing.set()
+        # Coupe les connexions en cours : les relais voient la fin de flux et libèrent leur thread
+        # (les threads du pool ne sont pas des démons, l'interpréteur les attend à la sortie)
+        with self.connections_lock:
+            for sock in self.connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
         if self.proxy_socket:
             self.proxy_socket.close()
             self.logger.info("Proxy closed")
@@ -4,17 +4,100 @@ Reçoit les messages et détecte les attaques MITM
 """
 
 import socket
+import selectors
 import logging
+import logging.handlers
+import queue
 import time
 import os
-
-
-class Message:
-    """ Message structuré avec numéro de séquence, timestamp et payload."""
-    def __init__(self, sequence, timestamp, payload):
-        self.sequence = sequence
-        self.timestamp = timestamp
-        self.payload = payload
+import re
+
+
+# Format attendu d'un message : SEQ=<int>|TS=<int>|DATA=<payload> (compilé une seule fois)
+MESSAGE_PATTERN = re.compile(rb"SEQ=(\d+)\|TS=(\d+)\|DATA=(.*)")
+
+# Taille maximale d'un message en attente de son "\n"
+MAX_LINE_LENGTH = 65536
+
+# Taille des tampons noyau d'envoi/réception des sockets
+SOCKET_BUFFER_SIZE = 1 << 20
+
+# Fenêtre glissante de détection des rejeux (puissance de deux, indexée par masque)
+REPLAY_BUF = 1024
+# Valeur d'une case vide de la fenêtre (aucun numéro de séquence reçu)
+EMPTY_SLOT = 0xFFFFFFFFFFFFFFFF
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler qui transmet l'enregistrement tel quel (même processus, pas de sérialisation) :
+    le formatage est différé au thread du QueueListener """
+    def prepare(self, record):
+        return record
+
+
+# Bits du masque d'alertes retourné par _detect
+ALERT_REPLAY = 1
+ALERT_REORDER = 2
+ALERT_DROP = 4
+ALERT_DELAY = 8
+ALERT_JUMP = 16
+
+
+class ClientState:
+    """ État de détection propre à une connexion cliente """
+    __slots__ = ("address", "pending", "most_recent_sequence", "received", "jump_candidate", "gap_end")
+
+    def __init__(self, address):
+        self.address = address
+        self.pending = bytearray()  # Octets reçus pas encore terminés par "\n" (message coupé entre deux recv)
+        self.most_recent_sequence = 0  # Plus grand numéro de séquence reçu
+        self.received = [EMPTY_SLOT] * REPLAY_BUF  # Derniers numéros reçus, case = SEQ & (REPLAY_BUF - 1)
+        self.jump_candidate = None  # Dernier SEQ ignoré car trop en avance, en attente de confirmation
+        self.gap_end = 0  # Borne haute (exclue) du dernier trou de séquence signalé par ALERT_DROP
+
+
+def _detect(sequence, timestamp, now, state, max_delay):
+    """ Détection des attaques sur un message, en une seule fonction sur des entiers :
+    retourne un masque de bits ALERT_* (0 si aucune) et met à jour l'état de la connexion """
+    # Paquet retardé
+    alerts = ALERT_DELAY if now - timestamp > max_delay else 0
+
+    most_recent = state.most_recent_sequence
+    received = state.received
+
+    # Saut de plus d'une fenêtre en avant : un seul paquet forgé (ex. SEQ=2**63) ne doit pas faire
+    # passer tout le trafic légitime pour du rejeu. Le saut n'est accepté que confirmé par le SEQ suivant
+    if sequence > most_recent + REPLAY_BUF:
+        candidate = state.jump_candidate
+        if candidate is None or sequence != candidate + 1:
+            state.jump_candidate = sequence
+            return alerts | ALERT_JUMP
+        # Saut confirmé : le candidat a bien été reçu, le trou s'arrête avant lui
+        received[candidate & (REPLAY_BUF - 1)] = candidate
+        received[sequence & (REPLAY_BUF - 1)] = sequence
+        state.jump_candidate = None
+        state.most_recent_sequence = sequence
+        state.gap_end = candidate
+        return alerts | ALERT_DROP
+    state.jump_candidate = None
+
+    # Paquet rejoué : trop ancien pour la fenêtre circulaire, ou déjà présent dans sa case
+    if sequence + REPLAY_BUF <= most_recent:
+        return alerts | ALERT_REPLAY
+    index = sequence & (REPLAY_BUF - 1)
+    if received[index] == sequence:
+        return alerts | ALERT_REPLAY
+    received[index] = sequence
+
+    # Paquet reordonné (plus ancien que le dernier reçu) ou paquets perdus (saut de séquence)
+    if sequence < most_recent:
+        return alerts | ALERT_REORDER
+    if sequence > most_recent:
+        state.most_recent_sequence = sequence
+        if sequence > most_recent + 1:
+            state.gap_end = sequence
+            alerts |= ALERT_DROP
+    return alerts
 
 
 class DetectionServer:
@@ -26,10 +109,12 @@ class DetectionServer:
         self.port = port
         self.max_delay = max_delay
         self.buffer_size = buffer_size
-        
-        self.expected_sequence = 1  # Numéro de séquence attendu
+        # Activation de la détection, lue une seule fois au démarrage
+        self.detection_enabled = os.getenv("SERVER_DETECTION_ENABLED", "true").lower() == "true"
+
         self.server_socket = None
-        self.client_socket = None
+        self.selector = None
+        self.view = None
         self._setup_logging()
 
     def _setup_logging(self):
@@ -40,129 +125,158 @@ class DetectionServer:
         )
         self.logger = logging.getLogger(__name__)
 
-    def _parse_message(self, raw_message):
-
-        """ Décomposition du message en format structuré """
-        parts = raw_message.split("|")
-        fields = {}
+        # Les messages du serveur passent par une file : le thread de réception ne paie qu'un
+        # ajout en file, le formatage et l'écriture sont faits par le thread du QueueListener
+        log_queue = queue.SimpleQueue()
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        self._log_handler = _LocalQueueHandler(log_queue)
+        self.logger.addHandler(self._log_handler)
+        self.logger.propagate = False
+        self._log_listener.start()
 
-        for part in parts:
-            key, value = part.split("=", 1)
-            fields[key] = value
+    def _tune_socket(self, sock):
+        """ Désactive Nagle et agrandit les tampons noyau du socket """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
 
-        return Message(
-            sequence=int(fields["SEQ"]),
-            timestamp=int(fields["TS"]),
-            payload=fields["DATA"]
-        )
+    def _parse_message(self, raw_message):
 
-    def _detect_dropped_packets(self, sequence):
-        """ Détection des paquets perdus """
-        
-        if sequence > self.expected_sequence:
-            # Gap detected - packets were dropped
-            missing_range = list(range(self.expected_sequence, sequence))
+        """ Décomposition du message (bytes) en tuple (séquence, timestamp, payload) """
+        match = MESSAGE_PATTERN.fullmatch(raw_message)
+        if match is None:
+            raise ValueError("Malformed message")
+
+        sequence, timestamp, payload = match.groups()
+        return int(sequence), int(timestamp), payload.decode("utf-8", errors="replace")
+
+    def _log_alerts(self, alerts, sequence, timestamp, now, previous, gap_end):
+        """ Journalisation des alertes levées par _detect (previous : plus grand SEQ avant ce message,
+        gap_end : borne haute exclue du trou signalé par ALERT_DROP) """
+        if alerts & ALERT_REPLAY:
+            if sequence + REPLAY_BUF <= previous:
+                # Trop ancien pour la fenêtre : impossible de prouver qu'il n'a pas déjà été reçu
+                self.logger.critical(
+                    "[ALERT] REPLAYED PACKET: SEQ=%d is older than the replay window (latest SEQ=%d)",
+                    sequence, previous
+                )
+            else:
+                self.logger.critical("[ALERT] REPLAYED PACKET: SEQ=%d already received", sequence)
+
+        if alerts & ALERT_JUMP:
             self.logger.critical(
-                f"[ALERT] DROPPED PACKETS DETECTED: Missing sequence numbers {missing_range}"
+                "[ALERT] SEQUENCE JUMP: SEQ=%d is %d ahead of latest SEQ=%d, ignored until the next SEQ confirms it",
+                sequence, sequence - previous, previous
             )
-            self.expected_sequence = sequence + 1
-            return True
-        elif sequence == self.expected_sequence:
-            # Normal case - sequence is as expected
-            self.expected_sequence = sequence + 1
-            return False
-        else:
-            # sequence < expected_sequence - handled by reorder detection
-            return False
 
-    def _detect_reorder_attack(self, sequence):
-        """ Détection des paquets reordonnés """
-        if sequence < self.expected_sequence:
+        if alerts & ALERT_REORDER:
             self.logger.critical(
-                f"[ALERT] OUT-OF-ORDER PACKET: Received SEQ={sequence}, Expected SEQ={self.expected_sequence}"
+                "[ALERT] OUT-OF-ORDER PACKET: Received SEQ=%d, Expected SEQ=%d", sequence, previous + 1
             )
-            return True
-        return False
 
-    def _detect_delay_attack(self, timestamp):
-        """Detect delay attacks"""
-        current_time = int(time.time())
-        delay = current_time - timestamp
+        if alerts & ALERT_DROP:
+            # Gap detected - packets were dropped (log the bounds, never materialize the range)
+            self.logger.critical(
+                "[ALERT] DROPPED PACKETS DETECTED: %d missing, sequence numbers [%d..%d)",
+                gap_end - previous - 1, previous + 1, gap_end
+            )
 
-        if delay > self.max_delay:
+        if alerts & ALERT_DELAY:
             self.logger.critical(
-                f"[ALERT] DELAY ATTACK DETECTED: {delay}s > {self.max_delay}s"
+                "[ALERT] DELAY ATTACK DETECTED: %ds > %ss", now - timestamp, self.max_delay
             )
-            return True
-        
-        return False
 
-    def _detect_integrity_violation(self, raw_message):
-        """ Détection des violations d'intégrité (Message qui ne respecte pas le format structuré attendu) """
+    def _process_message(self, raw_message, now, state):
+        """ Algorithme de traitement et d'analyse des messages arrivés"""
+        # Détection des violations d'intégrité : un échec d'analyse signale un message hors format
         try:
-            self._parse_message(raw_message)
-            return False
+            sequence, timestamp, payload = self._parse_message(raw_message)
         except Exception:
             self.logger.critical(
-                f"[ALERT] Message integrity violation detected: {raw_message}"
+                f"[ALERT] Message integrity violation detected: {raw_message.decode('utf-8', errors='replace')}"
             )
-            return True
-
-    def _process_message(self, raw_message):
-        """ Algorithme de traitement et d'analyse des messages arrivés"""
-        if self._detect_integrity_violation(raw_message):
             return
-        try:
-            message = self._parse_message(raw_message) 
-            
-            # Vérification si la détection est activée
-            detection_enabled = os.getenv("SERVER_DETECTION_ENABLED", "true").lower() == "true"
 
+        try:
             # Algorithme de détection (seulement si activé)
-            if detection_enabled:
-                # Vérification si le paquet est reordonné
-                self._detect_reorder_attack(message.sequence)
-                
-                # Vérification si le paquet est perdu
-                self._detect_dropped_packets(message.sequence)
-                
-                # Vérification si le paquet est retardé
-                self._detect_delay_attack(message.timestamp)
+            if self.detection_enabled:
+                previous = state.most_recent_sequence
+                alerts = _detect(sequence, timestamp, now, state, self.max_delay)
+                if alerts:
+                    self._log_alerts(alerts, sequence, timestamp, now, previous, state.gap_end)
             
-            delay = int(time.time()) - message.timestamp
-
-            # Log du message normal
-            self.logger.info(
-                f"SEQ={message.sequence} | TS={message.timestamp} | Delay={delay}s | DATA={message.payload}"
-            )
+            # Log du message normal (formatage différé, ignoré si le niveau INFO est filtré)
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(
+                    "SEQ=%d | TS=%d | Delay=%ds | DATA=%s",
+                    sequence, timestamp, now - timestamp, payload
+                )
 
         except Exception as e:
             self.logger.error(f"Error processing message: {e}")
 
-    def _handle_client(self, client_socket, address):
-        """ Gestion de la connexion et du traitement des messages """
-        self.logger.info(f"Connected with {address}")
+    def _accept_client(self):
+        """ Acceptation d'une nouvelle connexion, surveillée ensuite par le sélecteur """
+        try:
+            client_socket, address = self.server_socket.accept()
+        except OSError as e:
+            # Connexion avortée avant l'acceptation (ex. ECONNABORTED) : les autres clients continuent
+            self.logger.error(f"Error accepting connection: {e}")
+            return
 
         try:
-            while True:
-                data = client_socket.recv(self.buffer_size)
-                if not data:
-                    self.logger.info("Client disconnected")
-                    break
-
-                # Décodage et séparation des messages
-                raw_data = data.decode("utf-8", errors="replace")
-                messages = raw_data.strip().split("\n")
-                
-                for msg in messages:
-                    if msg.strip():
-                        self._process_message(msg.strip())
+            self._tune_socket(client_socket)
+        except OSError as e:
+            self.logger.error(f"Error setting up connection with {address}: {e}")
+            client_socket.close()
+            return
 
-        except Exception as e:
-            self.logger.error(f"Error handling client: {e}")
+        self.selector.register(client_socket, selectors.EVENT_READ, data=ClientState(address))
+        self.logger.info(f"Connected with {address}")
 
-        finally:
-            client_socket.close()
+    def _handle_client(self, client_socket, state):
+        """ Lecture des données disponibles et traitement des messages complets.
+        Retourne False quand le client a fermé la connexion """
+        pending = state.pending
+        n = client_socket.recv_into(self.view)
+        if not n:
+            self.logger.info(f"Client {state.address} disconnected")
+            line = bytes(pending).strip()
+            if line:
+                self._process_message(line, int(time.time()), state)
+            return False
+
+        # Heure de réception commune à tous les messages de ce recv
+        now = int(time.time())
+
+        # Découpage des lignes complètes directement sur les octets
+        pending += self.view[:n]
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end < 0:
+                break
+            # Un seul strip() par ligne (tolère "\r\n" et les espaces de bord)
+            line = bytes(pending[start:end]).strip()
+            start = end + 1
+            if line:
+                self._process_message(line, now, state)
+        del pending[:start]
+
+        # Ligne sans fin trop longue : hors format, on la rejette pour borner la mémoire
+        if len(pending) > MAX_LINE_LENGTH:
+            self.logger.critical(
+                f"[ALERT] Message integrity violation detected: unterminated line of {len(pending)} bytes"
+            )
+            pending.clear()
+        return True
+
+    def _close_client(self, client_socket):
+        """ Retrait du sélecteur et fermeture d'une connexion cliente """
+        self.selector.unregister(client_socket)
+        client_socket.close()
 
     def run(self):
         """ Démarrage du serveur de détection et écoute des connexions """
@@ -170,17 +284,35 @@ class DetectionServer:
             # Création et configuration du socket serveur
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._tune_socket(self.server_socket)
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(1)
+            self.server_socket.listen()
 
             # Log server startup
             self.logger.info(f"Server started on {self.host}:{self.port}")
             self.logger.info(f"MAX_DELAY is set to {self.max_delay}s")
-            self.logger.info("Waiting for connection...")
+            self.logger.info("Waiting for connections...")
 
-            # Accept client connection
-            self.client_socket, address = self.server_socket.accept()
-            self._handle_client(self.client_socket, address)
+            # Tampon de réception partagé : toutes les lectures se font dans ce thread
+            self.view = memoryview(bytearray(self.buffer_size))
+
+            # Un seul thread multiplexe le socket d'écoute et tous les clients (epoll sous Linux)
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.server_socket, selectors.EVENT_READ, data=None)
+            while True:
+                for key, _ in self.selector.select():
+                    if key.data is None:
+                        self._accept_client()
+                        continue
+
+                    client_socket = key.fileobj
+                    try:
+                        alive = self._handle_client(client_socket, key.data)
+                    except Exception as e:
+                        self.logger.error(f"Error handling client {key.data.address}: {e}")
+                        alive = False
+                    if not alive:
+                        self._close_client(client_socket)
 
         except KeyboardInterrupt:
             self.logger.info("Server interrupted (Ctrl+C)")
@@ -193,11 +325,17 @@ class DetectionServer:
 
     def close(self):
         # Fermeture des sockets et nettoyage des ressources
-        if self.client_socket:
-            self.client_socket.close()
+        if self.selector:
+            for key in list(self.selector.get_map().values()):
+                if key.data is not None:
+                    key.fileobj.close()
+            self.selector.close()
         if self.server_socket:
             self.server_socket.close()
         self.logger.info("Server closed")
+        # Vide la file de logs avant de rendre la main
+        self.logger.removeHandler(self._log_handler)
+        self._log_listener.stop()
 
 
 def main():